@@ -0,0 +1,67 @@
+import io
+import os
+import sys
+import glob
+import tempfile
+import argparse
+from itertools import zip_longest
+from contextlib import redirect_stdout
+from mxlExtractor import extract_stream, extract_music21
+
+# --- CLI SETUP ---
+parser = argparse.ArgumentParser(description="Check that the stream and music21 extractors write identical CSVs.")
+parser.add_argument('files', nargs='*', help='Scores to compare (default: every .mxl in Songs/).')
+
+
+def first_difference(path_a, path_b):
+    """1-based line number and the two differing lines, or None if the files are identical"""
+    with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+        for number, (line_a, line_b) in enumerate(zip_longest(a, b), start=1):
+            if line_a != line_b:
+                return number, line_a, line_b
+    return None
+
+
+def compare_score(file_path):
+    """Extract with both backends; returns a list of mismatch messages, or None if music21 can't parse it"""
+    with tempfile.TemporaryDirectory() as stream_dir, tempfile.TemporaryDirectory() as music21_dir:
+        # Both extractors print a line per part; keep only the summary
+        with redirect_stdout(io.StringIO()):
+            extract_stream(file_path, stream_dir)
+        try:
+            with redirect_stdout(io.StringIO()):
+                extract_music21(file_path, music21_dir)
+        except Exception as e:
+            print(f"  music21 can't parse this score ({type(e).__name__}: {e}); skipped")
+            return None
+
+        stream_files = set(os.listdir(stream_dir))
+        music21_files = set(os.listdir(music21_dir))
+        problems = [f"only written by {backend}: {name}"
+                    for backend, names in (("stream", stream_files - music21_files),
+                                           ("music21", music21_files - stream_files))
+                    for name in sorted(names)]
+
+        for name in sorted(stream_files & music21_files):
+            difference = first_difference(os.path.join(stream_dir, name), os.path.join(music21_dir, name))
+            if difference:
+                number, line_a, line_b = difference
+                problems.append(f"{name} line {number}: stream {line_a!r} != music21 {line_b!r}")
+
+        print(f"  {len(stream_files & music21_files)} CSVs compared, {len(problems)} mismatches")
+        return problems
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    files = args.files or sorted(glob.glob(os.path.join('Songs', '*.mxl')))
+
+    failed = False
+    for file_path in files:
+        print(f"\nComparing {file_path}")
+        problems = compare_score(file_path)
+        for problem in problems or []:
+            print(f"  {problem}")
+        failed = failed or bool(problems)
+
+    sys.exit(1 if failed else 0)
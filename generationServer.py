@@ -0,0 +1,527 @@
+import os
+import json
+import math
+import base64
+import struct
+import asyncio
+import argparse
+from collections import OrderedDict, defaultdict
+
+import markovgeneration
+import markovgenerationjoint
+from quantize import parse_pitch, quantize_sequence, MIN_OCTAVE, MAX_OCTAVE
+from seeding import make_rng, make_numpy_rng
+
+# --- CLI SETUP ---
+parser = argparse.ArgumentParser(description="Local generation server that keeps trained Markov/HMM models warm.")
+parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on.')
+parser.add_argument('--port', type=int, default=8765, help='TCP port to listen on.')
+parser.add_argument('--socket', type=str, default=None, help='Listen on this Unix socket instead of TCP.')
+parser.add_argument('--input', type=str, default='output', help='Base directory for input CSVs.')
+parser.add_argument('--cache_size', type=int, default=32, help='Number of trained models kept in memory.')
+parser.add_argument('--batch_window', type=float, default=0.0, help='Milliseconds to wait for more requests before sampling a batch.')
+
+# Requests are one JSON object per line, e.g.
+#   {"id": 1, "model": "markov", "song": "the-avengers-theme-song-check-my-new-version_data",
+#    "instrument": "Violin_1", "order": 2, "length": 100, "format": "json"}
+# "model" is markov (one instrument), joint or hmm (all instruments of the song).
+# An optional "seed" (plus "variation", default 0) makes the take reproducible: markov
+# and joint takes match the CLI scripts run with the same --seed.
+# Responses echo the id and carry either "tracks" (event JSON), "midi" (base64) or "error".
+
+DEFAULTS = {
+    "markov": {"order": 2, "length": 100},
+    "joint": {"order": 2, "length": 100, "measures": None, "beats_per_measure": 4},
+    "hmm": {"states": 8, "measures": 50, "beats_per_measure": 4.0},
+}
+# (type, minimum, maximum) for the numeric request fields, following the CLI flag types;
+# a None bound is open. Lengths are capped so one request can't tie up the server.
+NUMBER_FIELDS = {
+    "order": (int, 1, 16),
+    "length": (int, 1, 10000),
+    "measures": (int, 1, 2000),
+    "beats_per_measure": (int, 1, 64),
+    "states": (int, 1, 256),
+    "grid": (int, 1, 96),
+    "fold_octave": (int, MIN_OCTAVE, MAX_OCTAVE),
+    "seed": (int, None, None),
+    "variation": (int, 0, None),
+}
+# hmmgeneration.py takes --beats_per_measure as a float
+FLOAT_FIELDS = {"hmm": ("beats_per_measure",)}
+HMM_CHUNK = 64
+# Every HMM is trained from this seed, so seeded requests share one warm model and the
+# request seed only picks the sampling stream (same model as hmmgeneration.py --seed 0)
+HMM_TRAINING_SEED = 0
+# Longest take in quarter notes (measures * beats_per_measure), e.g. 2048 bars of 4/4
+MAX_QUARTERS = 8192
+# Groups expected to produce more output rows (events x instruments) than this are
+# sampled and encoded in a worker thread instead of on the event loop
+INLINE_ROWS = 20000
+TICKS_PER_QUARTER = 480
+
+
+# ------------------- REQUESTS -------------------
+
+def normalize_request(request):
+    """Fill in defaults and validate a request, raising ValueError on bad input"""
+    model = request.get("model", "markov")
+    if not isinstance(model, str) or model not in DEFAULTS:
+        raise ValueError(f"Unknown model {model!r}")
+
+    # Plain folder/file names only, so requests can't reach outside --input
+    for field in ("song", "instrument") if model == "markov" else ("song",):
+        value = request.get(field)
+        if not isinstance(value, str) or value in ("", ".", "..") or os.path.basename(value) != value:
+            raise ValueError(f"Missing or invalid '{field}'")
+
+    normalized = dict(DEFAULTS[model])
+    normalized.update({k: v for k, v in request.items() if v is not None})
+    normalized["model"] = model
+    normalized.setdefault("variation", 0)
+    for field, (kind, low, high) in NUMBER_FIELDS.items():
+        if normalized.get(field) is not None:
+            if field in FLOAT_FIELDS.get(model, ()):
+                kind = float
+            check_number(field, normalized[field], kind, low, high)
+    if normalized.get("measures") and normalized["measures"] * normalized["beats_per_measure"] > MAX_QUARTERS:
+        raise ValueError(f"'measures' * 'beats_per_measure' must be at most {MAX_QUARTERS}")
+    if not isinstance(normalized.get("canonical_chords", False), bool):
+        raise ValueError("'canonical_chords' must be true or false")
+    normalized["format"] = request.get("format", "json")
+    if normalized["format"] not in ("json", "midi"):
+        raise ValueError(f"Unknown format '{normalized['format']}'")
+    return normalized
+
+
+def check_number(field, value, kind, low, high):
+    allowed = (int, float) if kind is float else int
+    # Ints are compared as ints: huge ones would overflow math.isfinite
+    if (isinstance(value, bool) or not isinstance(value, allowed)
+            or (isinstance(value, float) and not math.isfinite(value))):
+        raise ValueError(f"'{field}' must be {'a number' if kind is float else 'an integer'}")
+    if (low is not None and value < low) or (high is not None and value > high):
+        bounds = f"at least {low}" if high is None else f"between {low} and {high}"
+        raise ValueError(f"'{field}' must be {bounds}")
+
+
+def model_key(request):
+    """Everything that changes the trained model; requests sharing a key share a model"""
+    quantize_opts = (request.get("grid"), bool(request.get("canonical_chords")), request.get("fold_octave"))
+    if request["model"] == "markov":
+        return "markov", request["song"], request["instrument"], request["order"], quantize_opts
+    if request["model"] == "joint":
+        return "joint", request["song"], request["order"], quantize_opts
+    return "hmm", request["song"], request["states"], quantize_opts
+
+
+def quantize_kwargs(key):
+    grid, canonical_chords, fold_octave = key[-1]
+    if grid is None and not canonical_chords and fold_octave is None:
+        return None
+    return {"grid": grid, "canonical_chords": canonical_chords, "fold_octave": fold_octave}
+
+
+# ------------------- TRAINING -------------------
+
+def song_csvs(input_base, song):
+    folder = os.path.join(input_base, song)
+    if not os.path.isdir(folder):
+        raise ValueError(f"Song folder '{song}' not found in '{input_base}'")
+    return {os.path.splitext(f)[0]: os.path.join(folder, f)
+            for f in sorted(os.listdir(folder)) if f.endswith(".csv")}
+
+
+def load_joint_sequence(input_base, song, quantize_opts):
+    joint_sequence, instrument_names = markovgenerationjoint.build_joint_sequence(song_csvs(input_base, song))
+    if quantize_opts:
+        joint_sequence = [tuple(quantize_sequence(state, **quantize_opts)) for state in joint_sequence]
+    return joint_sequence, instrument_names
+
+
+def train_model(input_base, key):
+    """Load CSVs and train the model for a cache key (runs in a worker thread)"""
+    kind, song = key[0], key[1]
+    quantize_opts = quantize_kwargs(key)
+
+    if kind == "markov":
+        instrument, order = key[2], key[3]
+        csv_path = song_csvs(input_base, song).get(instrument)
+        if csv_path is None:
+            raise ValueError(f"Instrument '{instrument}' not found in '{song}'")
+        chain, sequence = markovgeneration.build_chain(csv_path, order, quantize_opts)
+        return {"kind": kind, "chain": chain, "sequence": sequence, "names": [instrument]}
+
+    joint_sequence, instrument_names = load_joint_sequence(input_base, song, quantize_opts)
+
+    if kind == "joint":
+        chain = markovgenerationjoint.build_joint_chain(joint_sequence, key[2])
+        return {"kind": kind, "chain": chain, "names": instrument_names}
+
+    # hmmlearn/numpy are only needed once someone asks for an HMM
+    import numpy as np
+    import hmmgeneration
+
+    encoded_seq, event_map, reverse_map = hmmgeneration.encode_joint_sequence(joint_sequence)
+    model = hmmgeneration.train_hmm(encoded_seq, key[2], n_features=len(event_map),
+                                    random_state=make_numpy_rng(HMM_TRAINING_SEED, song, "train"))
+
+    # hmmgeneration samples one step at a time from a fresh start state, so each event
+    # is an independent draw from the start-state mixture of the emission rows.
+    mixture = model.startprob_ @ model.emissionprob_
+    durations = np.array([max(event[2] for event in reverse_map[i]) for i in range(len(reverse_map))])
+    return {"kind": kind, "mixture": mixture / mixture.sum(), "durations": durations,
+            "reverse_map": reverse_map, "names": instrument_names}
+
+
+class ModelCache:
+    """LRU cache of trained models; concurrent misses on one key train it once"""
+
+    def __init__(self, input_base, capacity):
+        self.input_base = input_base
+        self.capacity = capacity
+        self.models = OrderedDict()
+        self.training = {}
+
+    async def get(self, key):
+        if key in self.models:
+            self.models.move_to_end(key)
+            return self.models[key]
+
+        if key in self.training:
+            return await self.training[key]
+
+        future = asyncio.get_running_loop().run_in_executor(None, train_model, self.input_base, key)
+        self.training[key] = future
+        try:
+            warm = await future
+        finally:
+            del self.training[key]
+
+        self.models[key] = warm
+        while len(self.models) > self.capacity:
+            self.models.popitem(last=False)
+        return warm
+
+
+# ------------------- SAMPLING -------------------
+
+def split_joint(sequence, instrument_names):
+    return {name: [state[i] for state in sequence] for i, name in enumerate(instrument_names)}
+
+
+def sample_markov(warm, request):
+    if request["model"] == "markov":
+        rng = make_rng(request.get("seed"), request["song"], request["instrument"], request["variation"])
+        sequence = markovgeneration.generate_sequence(warm["chain"], warm["sequence"],
+                                                      request["order"], request["length"], rng)
+        if sequence == ["Insufficient Data"]:
+            raise ValueError("Insufficient data to build a chain")
+        return {warm["names"][0]: sequence}
+
+    if not warm["chain"]:
+        raise ValueError("Insufficient data to build a chain")
+    rng = make_rng(request.get("seed"), request["song"], request["variation"])
+    if request["measures"]:
+        sequence = markovgenerationjoint.generate_joint_sequence_by_measures(
+            warm["chain"], request["order"], request["measures"], request["beats_per_measure"], rng)
+    else:
+        sequence = markovgenerationjoint.generate_joint_sequence(warm["chain"], request["order"],
+                                                                 request["length"], rng)
+    return split_joint(sequence, warm["names"])
+
+
+def sample_hmm(warm, request, row, random_state):
+    """Turn pre-drawn event indices into a take, drawing more from random_state as needed"""
+    import numpy as np
+
+    mixture, durations = warm["mixture"], warm["durations"]
+    max_time = request["measures"] * request["beats_per_measure"]
+    indices = []
+    total_time = 0
+    while total_time < max_time:
+        if not len(row):
+            row = random_state.choice(len(mixture), size=HMM_CHUNK, p=mixture)
+        cumulative = total_time + np.cumsum(durations[row])
+        stop = int(np.searchsorted(cumulative, max_time)) + 1
+        indices.extend(row[:stop].tolist())
+        total_time = float(cumulative[min(stop, len(row)) - 1])
+        row = row[stop:]
+    return split_joint([warm["reverse_map"][i] for i in indices], warm["names"])
+
+
+def sample_hmm_batch(warm, requests):
+    """Draw the unseeded requests' events from one vectorised numpy call"""
+    import numpy as np
+
+    mixture = warm["mixture"]
+    unseeded = sum(1 for request in requests if request.get("seed") is None)
+    draws = iter(np.random.choice(len(mixture), size=(unseeded, HMM_CHUNK), p=mixture) if unseeded else ())
+
+    results = []
+    for request in requests:
+        try:
+            # Seeded requests draw from their own stream, so batching can't change them
+            random_state = make_numpy_rng(request.get("seed"), request["song"], request["variation"])
+            if random_state is None:
+                random_state, row = np.random, next(draws)
+            else:
+                row = random_state.choice(len(mixture), size=HMM_CHUNK, p=mixture)
+            results.append(sample_hmm(warm, request, row, random_state))
+        except (ValueError, TypeError) as e:
+            results.append(e)
+    return results
+
+
+def expected_events(request):
+    """Rough size of a take, used to keep big sampling jobs off the event loop"""
+    if request.get("measures"):
+        return request["measures"] * request["beats_per_measure"]
+    return request.get("length", 0)
+
+
+def sample_batch(warm, requests):
+    """Sample every request that shares this model; errors are returned per request"""
+    if warm["kind"] == "hmm":
+        return sample_hmm_batch(warm, requests)
+
+    results = []
+    for request in requests:
+        try:
+            results.append(sample_markov(warm, request))
+        except (ValueError, TypeError) as e:
+            results.append(e)
+    return results
+
+
+# ------------------- OUTPUT -------------------
+
+def finite_or_none(value):
+    # nan beats (measures without a time signature) have no JSON spelling
+    return value if math.isfinite(value) else None
+
+
+def event_to_json(event):
+    fields = {"type": event[0], "pitch": event[1],
+              "duration": finite_or_none(event[2]), "beat": finite_or_none(event[-1])}
+    if len(event) == 5:
+        fields["measure"] = event[3]
+    return fields
+
+
+def midi_numbers(event_type, content):
+    if event_type == "Rest" or content == "REST":
+        return []
+    numbers = []
+    for name in content.split(";"):
+        parsed = parse_pitch(name)
+        if parsed is None:
+            continue
+        semitone, octave = parsed
+        numbers.append(min(127, max(0, semitone + 12 * ((octave if octave is not None else 4) + 1))))
+    return numbers
+
+
+def variable_length(value):
+    data = [value & 0x7F]
+    value >>= 7
+    while value:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(data))
+
+
+def midi_track(name, events, channel):
+    data = bytearray(b"\x00\xff\x03" + variable_length(len(name.encode())) + name.encode())
+    delta = 0
+    for event in events:
+        ticks = round(event[2] * TICKS_PER_QUARTER) if math.isfinite(event[2]) else 0
+        pitches = midi_numbers(event[0], event[1])
+        if not pitches or ticks <= 0:
+            delta += max(ticks, 0)
+            continue
+        for i, pitch in enumerate(pitches):
+            data += variable_length(delta if i == 0 else 0) + bytes([0x90 | channel, pitch, 64])
+        for i, pitch in enumerate(pitches):
+            data += variable_length(ticks if i == 0 else 0) + bytes([0x80 | channel, pitch, 0])
+        delta = 0
+    data += variable_length(delta) + b"\xff\x2f\x00"
+    return b"MTrk" + struct.pack(">I", len(data)) + bytes(data)
+
+
+def tracks_to_midi(tracks):
+    """Write a format-1 MIDI file with one track per instrument (channel 10 left for drums)"""
+    channels = [c for c in range(16) if c != 9]
+    header = b"MThd" + struct.pack(">IHHH", 6, 1, len(tracks), TICKS_PER_QUARTER)
+    return header + b"".join(midi_track(name, events, channels[i % len(channels)])
+                             for i, (name, events) in enumerate(tracks.items()))
+
+
+def encode_response(response):
+    """One JSON line; NaN/Infinity are refused so every line stays valid JSON"""
+    try:
+        if "tracks" in response:
+            # One dumps() call per track: the C encoder holds the GIL for a whole call,
+            # which would stall the event loop on big takes encoded in a worker thread
+            tracks = ", ".join(f"{json.dumps(name)}: {json.dumps(events, allow_nan=False)}"
+                               for name, events in response["tracks"].items())
+            return f'{{"id": {json.dumps(response["id"])}, "tracks": {{{tracks}}}}}'
+        return json.dumps(response, allow_nan=False)
+    except ValueError as e:
+        return json.dumps({"id": response.get("id"), "error": f"Could not encode response: {e}"})
+
+
+def build_response(request_id, request, tracks):
+    if request["format"] == "midi":
+        return {"id": request_id, "midi": base64.b64encode(tracks_to_midi(tracks)).decode("ascii")}
+    return {"id": request_id, "tracks": {name: [event_to_json(e) for e in events] for name, events in tracks.items()}}
+
+
+# ------------------- SERVER -------------------
+
+def reject_constant(name):
+    raise ValueError(f"{name} is not valid JSON")
+
+
+def answer_error(item, error):
+    """Resolve a queued (key, id, request, future) item with an error, unless it was already answered"""
+    _, request_id, _, future = item
+    if not future.done():
+        future.set_result(encode_response({"id": request_id, "error": str(error)}))
+
+
+def respond_group(warm, items):
+    """Sample a group and encode one response line per item (may run in a worker thread)"""
+    results = sample_batch(warm, [item[2] for item in items])
+    lines = []
+    for (_, request_id, request, _), tracks in zip(items, results):
+        try:
+            if isinstance(tracks, Exception):
+                raise tracks
+            lines.append(encode_response(build_response(request_id, request, tracks)))
+        except Exception as e:
+            lines.append(encode_response({"id": request_id, "error": str(e)}))
+    return lines
+
+
+class GenerationServer:
+    """Queues incoming requests and samples them in batches grouped by model"""
+
+    def __init__(self, input_base, cache_size, batch_window):
+        self.cache = ModelCache(input_base, cache_size)
+        self.batch_window = batch_window / 1000.0
+        self.queue = asyncio.Queue()
+        # The event loop only keeps weak references to tasks
+        self.running = set()
+
+    async def submit(self, raw_request):
+        request_id = raw_request.get("id")
+        try:
+            request = normalize_request(raw_request)
+        except Exception as e:
+            return encode_response({"id": request_id, "error": str(e)})
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((model_key(request), request_id, request, future))
+        return await future
+
+    async def batch_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            try:
+                # Let other connections enqueue, then take everything that is waiting
+                await asyncio.sleep(self.batch_window)
+                while not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                groups = defaultdict(list)
+                for item in batch:
+                    try:
+                        groups[item[0]].append(item)
+                    except TypeError as e:
+                        answer_error(item, e)
+                for key, items in groups.items():
+                    task = asyncio.create_task(self.run_group(key, items))
+                    self.running.add(task)
+                    task.add_done_callback(self.running.discard)
+            except Exception as e:
+                # This is the only batcher: answer what's left of the batch and keep going
+                for item in batch:
+                    answer_error(item, e)
+
+    async def run_group(self, key, items):
+        try:
+            warm = await self.cache.get(key)
+            rows = sum(expected_events(item[2]) for item in items) * len(warm["names"])
+            if rows > INLINE_ROWS:
+                lines = await asyncio.get_running_loop().run_in_executor(None, respond_group, warm, items)
+            else:
+                lines = respond_group(warm, items)
+        except Exception as e:
+            lines = [encode_response({"id": item[1], "error": str(e)}) for item in items]
+
+        for (_, _, _, future), line in zip(items, lines):
+            if not future.done():
+                future.set_result(line)
+
+    async def handle_connection(self, reader, writer):
+        tasks = set()
+
+        async def respond(line):
+            try:
+                request = json.loads(line, parse_constant=reject_constant)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object")
+            except ValueError as e:
+                line = encode_response({"id": None, "error": f"Bad request: {e}"})
+            else:
+                # Every request line gets an answer, whatever goes wrong
+                try:
+                    line = await self.submit(request)
+                except Exception as e:
+                    line = encode_response({"id": request.get("id"), "error": str(e)})
+            writer.write(line.encode("utf-8") + b"\n")
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(respond(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except ValueError as e:
+            # Line longer than the stream limit; the rest of the stream can't be framed
+            writer.write(encode_response({"id": None, "error": f"Bad request: {e}"}).encode("utf-8") + b"\n")
+        except ConnectionError:
+            pass
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+
+async def serve(args):
+    server = GenerationServer(args.input, args.cache_size, args.batch_window)
+    batcher = asyncio.create_task(server.batch_loop())
+
+    if args.socket:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=args.socket)
+        print(f"Generation server listening on {args.socket}")
+    else:
+        listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+        print(f"Generation server listening on {args.host}:{args.port}")
+
+    async with listener:
+        try:
+            await listener.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+# ------------------- MAIN -------------------
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\nGeneration server stopped.")
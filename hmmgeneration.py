@@ -3,8 +3,9 @@ import csv
 import argparse
 import numpy as np
 from collections import defaultdict
+from quantize import add_quantize_args, quantize_options, parse_quarter, quantize_sequence, report_quantization
+from seeding import add_seed_args, make_numpy_rng, variation_suffix
 from hmmlearn.hmm import CategoricalHMM
-import random
 
 # --- CLI SETUP ---
 parser = argparse.ArgumentParser(description="Joint multi-instrument HMM CSV generator (CategoricalHMM)")
@@ -13,7 +14,8 @@ parser.add_argument('--measures', type=int, default=50, help='Number of measures
 parser.add_argument('--beats_per_measure', type=float, default=4.0, help='Beats per measure')
 parser.add_argument('--input', type=str, default='output', help='Base directory for input CSVs')
 parser.add_argument('--output', type=str, default='melodies', help='Base directory for generated CSVs')
-args = parser.parse_args()
+add_quantize_args(parser)
+add_seed_args(parser)
 
 
 # ------------------- HELPERS -------------------
@@ -26,9 +28,9 @@ def read_instrument_csv(csv_path):
             event = (
                 row.get("Type", "Note"),
                 row.get("Pitch/Content", "REST"),
-                float(row.get("Duration_QuarterNotes", 1.0)),
+                parse_quarter(row.get("Duration_QuarterNotes", 1.0)),
                 float(row.get("Measure", 1)),
-                float(row.get("Beat", 1))
+                parse_quarter(row.get("Beat", 1))
             )
             events.append(event)
     return events
@@ -74,9 +76,10 @@ def encode_joint_sequence(joint_sequence):
 
 # ------------------- HMM TRAINING -------------------
 
-def train_hmm(encoded_seq, n_states, n_features):
+def train_hmm(encoded_seq, n_states, n_features, random_state=None):
     """Train a categorical HMM on the encoded sequence"""
-    model = CategoricalHMM(n_components=n_states, n_iter=500, tol=1e-4, verbose=True)
+    model = CategoricalHMM(n_components=n_states, n_iter=500, tol=1e-4, verbose=True,
+                           random_state=random_state)
     model.n_features = n_features
     model.fit(encoded_seq)
     return model
@@ -84,13 +87,14 @@ def train_hmm(encoded_seq, n_states, n_features):
 
 # ------------------- GENERATION -------------------
 
-def generate_sequence(model, reverse_map, num_measures, beats_per_measure):
+def generate_sequence(model, reverse_map, num_measures, beats_per_measure, random_state=None):
     sequence = []
     total_time = 0
     max_time = num_measures * beats_per_measure
 
     while total_time < max_time:
-        X, Z = model.sample(1)
+        # random_state must be a RandomState, not an int, or every step would reseed
+        X, Z = model.sample(1, random_state=random_state)
         event_idx = int(X[0][0])
         joint_state = reverse_map[event_idx]
         sequence.append(joint_state)
@@ -128,40 +132,57 @@ def save_joint_csvs(result_sequence, instrument_names, output_dir):
 
 # ------------------- MAIN -------------------
 
-input_base = args.input
-output_base = args.output
+if __name__ == "__main__":
+    args = parser.parse_args()
 
-if not os.path.exists(input_base):
-    print(f"Input directory '{input_base}' not found.")
-    exit(1)
+    input_base = args.input
+    output_base = args.output
 
-for song_folder in os.listdir(input_base):
-    folder_path = os.path.join(input_base, song_folder)
-    if not os.path.isdir(folder_path):
-        continue
+    if not os.path.exists(input_base):
+        print(f"Input directory '{input_base}' not found.")
+        exit(1)
 
-    print(f"\nProcessing folder: {song_folder}")
+    # Sorted so instrument and song order never depends on the filesystem
+    for song_folder in sorted(os.listdir(input_base)):
+        folder_path = os.path.join(input_base, song_folder)
+        if not os.path.isdir(folder_path):
+            continue
 
-    # Map instrument name -> CSV path
-    instrument_csvs = {}
-    for csv_file in os.listdir(folder_path):
-        if csv_file.endswith(".csv"):
-            inst_name = os.path.splitext(csv_file)[0]
-            instrument_csvs[inst_name] = os.path.join(folder_path, csv_file)
+        print(f"\nProcessing folder: {song_folder}")
 
-    joint_sequence, instrument_names = build_joint_sequence(instrument_csvs)
-    encoded_seq, event_map, reverse_map = encode_joint_sequence(joint_sequence)
+        # Map instrument name -> CSV path
+        instrument_csvs = {}
+        for csv_file in sorted(os.listdir(folder_path)):
+            if csv_file.endswith(".csv"):
+                inst_name = os.path.splitext(csv_file)[0]
+                instrument_csvs[inst_name] = os.path.join(folder_path, csv_file)
 
-    # Train HMM
-    model = train_hmm(encoded_seq, args.states, n_features=len(event_map))
-    print(f"HMM trained with {args.states} hidden states and {len(event_map)} unique joint events.")
+        joint_sequence, instrument_names = build_joint_sequence(instrument_csvs)
 
-    # Generate new sequence
-    new_sequence = generate_sequence(model, reverse_map, args.measures, args.beats_per_measure)
+        # Quantize every instrument's event inside each joint state
+        quantize_opts = quantize_options(args)
+        if quantize_opts:
+            raw_joint_sequence = joint_sequence
+            joint_sequence = [tuple(quantize_sequence(state, **quantize_opts)) for state in raw_joint_sequence]
+            report_quantization(song_folder, raw_joint_sequence, joint_sequence)
 
-    # Save per-instrument CSVs
-    target_dir = os.path.join(output_base, song_folder + "_generated_hmm")
-    save_joint_csvs(new_sequence, instrument_names, target_dir)
-    print(f"CSV files saved in: {target_dir}")
+        encoded_seq, event_map, reverse_map = encode_joint_sequence(joint_sequence)
 
-print("\nAll sequences processed using HMM.")
+        # Train HMM
+        model = train_hmm(encoded_seq, args.states, n_features=len(event_map),
+                          random_state=make_numpy_rng(args.seed, song_folder, "train"))
+        print(f"HMM trained with {args.states} hidden states and {len(event_map)} unique joint events.")
+
+        for variation in range(args.variations):
+            # Generate new sequence
+            random_state = make_numpy_rng(args.seed, song_folder, variation)
+            new_sequence = generate_sequence(model, reverse_map, args.measures, args.beats_per_measure,
+                                             random_state)
+
+            # Save per-instrument CSVs
+            suffix = variation_suffix(variation, args.variations)
+            target_dir = os.path.join(output_base, song_folder + "_generated_hmm" + suffix)
+            save_joint_csvs(new_sequence, instrument_names, target_dir)
+            print(f"CSV files saved in: {target_dir}")
+
+    print("\nAll sequences processed using HMM.")
@@ -3,6 +3,8 @@ import os
 import random
 import argparse
 from collections import defaultdict
+from quantize import add_quantize_args, quantize_options, parse_quarter, quantize_sequence, report_quantization
+from seeding import add_seed_args, make_rng, variation_suffix
 
 # --- CLI SETUP ---
 parser = argparse.ArgumentParser(description="Generate melodies using a Markov Chain with full musical events.")
@@ -10,12 +12,13 @@ parser.add_argument('--order', type=int, default=2, help='Memory length (order)
 parser.add_argument('--length', type=int, default=100, help='Number of events to generate per file.')
 parser.add_argument('--input', type=str, default='output', help='Base directory for input CSVs.')
 parser.add_argument('--output', type=str, default='melodies', help='Base directory for generated files.')
-args = parser.parse_args()
+add_quantize_args(parser)
+add_seed_args(parser)
 
 
 # --- MARKOV CHAIN BUILDER USING FULL MUSICAL EVENTS ---
 
-def build_chain(csv_path, order):
+def build_chain(csv_path, order, quantize_opts=None):
     chain = defaultdict(list)
     sequence = []
 
@@ -36,13 +39,19 @@ def build_chain(csv_path, order):
         # Convert each row into a musical event token
         for row in reader:
             event = (
-                row["Type"],                           # Note or Rest
-                row["Pitch/Content"],                  # Pitch name or REST
-                float(row["Duration_QuarterNotes"]),   # Duration
-                float(row["Beat"])                     # Beat position
+                row["Type"],                                   # Note or Rest
+                row["Pitch/Content"],                          # Pitch name or REST
+                parse_quarter(row["Duration_QuarterNotes"]),   # Duration
+                parse_quarter(row["Beat"])                     # Beat position
             )
             sequence.append(event)
 
+    # Collapse near-duplicate events before counting states
+    if quantize_opts:
+        raw_sequence = sequence
+        sequence = quantize_sequence(raw_sequence, **quantize_opts)
+        report_quantization(os.path.basename(csv_path), raw_sequence, sequence, order)
+
     if len(sequence) <= order:
         return None, []
 
@@ -57,12 +66,12 @@ def build_chain(csv_path, order):
 
 # --- SEQUENCE GENERATOR ---
 
-def generate_sequence(chain, all_events, order, length):
+def generate_sequence(chain, all_events, order, length, rng=random):
     if not chain:
         return ["Insufficient Data"]
 
     # Start from learned state
-    current_state = random.choice(list(chain.keys()))
+    current_state = rng.choice(list(chain.keys()))
     result = list(current_state)
 
     while len(result) < length:
@@ -70,10 +79,10 @@ def generate_sequence(chain, all_events, order, length):
 
         # Dead-end fallback
         if not options:
-            current_state = random.choice(list(chain.keys()))
+            current_state = rng.choice(list(chain.keys()))
             options = chain[current_state]
 
-        next_event = random.choice(options)
+        next_event = rng.choice(options)
         result.append(next_event)
 
         # Slide Markov window
@@ -84,56 +93,64 @@ def generate_sequence(chain, all_events, order, length):
 
 # --- MAIN EXECUTION PIPELINE ---
 
-input_base = args.input
-output_base = args.output
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    input_base = args.input
+    output_base = args.output
 
-print(f"Running Markov generation with order={args.order}, length={args.length}")
+    print(f"Running Markov generation with order={args.order}, length={args.length}")
 
-if not os.path.exists(input_base):
-    print(f"Error: Input directory '{input_base}' not found.")
-else:
-    os.makedirs(output_base, exist_ok=True)
+    if not os.path.exists(input_base):
+        print(f"Error: Input directory '{input_base}' not found.")
+    else:
+        os.makedirs(output_base, exist_ok=True)
 
-    for song_folder in os.listdir(input_base):
-        input_path = os.path.join(input_base, song_folder)
+        # Sorted so instrument and song order never depends on the filesystem
+        for song_folder in sorted(os.listdir(input_base)):
+            input_path = os.path.join(input_base, song_folder)
 
-        if os.path.isdir(input_path):
-            target_dir = os.path.join(output_base, song_folder.replace("_data", "_generated"))
-            os.makedirs(target_dir, exist_ok=True)
+            if os.path.isdir(input_path):
+                target_dir = os.path.join(output_base, song_folder.replace("_data", "_generated"))
+                os.makedirs(target_dir, exist_ok=True)
 
-            print(f"\nProcessing folder: {song_folder}")
+                print(f"\nProcessing folder: {song_folder}")
 
-            for csv_file in os.listdir(input_path):
-                if csv_file.endswith(".csv"):
-                    file_path = os.path.join(input_path, csv_file)
+                for csv_file in sorted(os.listdir(input_path)):
+                    if csv_file.endswith(".csv"):
+                        file_path = os.path.join(input_path, csv_file)
+                        inst_name = os.path.splitext(csv_file)[0]
 
-                    chain, full_seq = build_chain(file_path, args.order)
+                        chain, full_seq = build_chain(file_path, args.order, quantize_options(args))
 
-                    if chain:
-                        print(f"{csv_file} → states learned: {len(chain)}")
-                    else:
-                        print(f"{csv_file} → insufficient data")
+                        if chain:
+                            print(f"{csv_file} → states learned: {len(chain)}")
+                        else:
+                            print(f"{csv_file} → insufficient data")
 
-                    new_melody = generate_sequence(chain, full_seq, args.order, args.length)
+                        for variation in range(args.variations):
+                            rng = make_rng(args.seed, song_folder, inst_name, variation)
+                            new_melody = generate_sequence(chain, full_seq, args.order, args.length, rng)
 
-                    # Write generated output
-                    output_file = os.path.join(target_dir, f"gen_{csv_file}")
-                    with open(output_file, mode='w', newline='', encoding='utf-8') as f:
-                        writer = csv.writer(f)
-                        writer.writerow([
-                            'Sequence_Step',
-                            'Type',
-                            'Pitch/Content',
-                            'Duration_QuarterNotes',
-                            'Beat'
-                        ])
+                            # Write generated output
+                            suffix = variation_suffix(variation, args.variations)
+                            output_file = os.path.join(target_dir, f"gen_{inst_name}{suffix}.csv")
+                            with open(output_file, mode='w', newline='', encoding='utf-8') as f:
+                                writer = csv.writer(f)
+                                writer.writerow([
+                                    'Sequence_Step',
+                                    'Type',
+                                    'Pitch/Content',
+                                    'Duration_QuarterNotes',
+                                    'Beat'
+                                ])
 
-                        for idx, event in enumerate(new_melody):
-                            if event == "Insufficient Data":
-                                writer.writerow([idx, "", "", "", ""])
-                                continue
+                                for idx, event in enumerate(new_melody):
+                                    if event == "Insufficient Data":
+                                        writer.writerow([idx, "", "", "", ""])
+                                        continue
 
-                            event_type, pitch, duration, beat = event
-                            writer.writerow([idx, event_type, pitch, duration, beat])
+                                    event_type, pitch, duration, beat = event
+                                    writer.writerow([idx, event_type, pitch, duration, beat])
 
-    print(f"\nAll generated melodies saved in: {output_base}")
+        print(f"\nAll generated melodies saved in: {output_base}")
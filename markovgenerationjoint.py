@@ -3,6 +3,8 @@ import os
 import random
 import argparse
 from collections import defaultdict
+from quantize import add_quantize_args, quantize_options, parse_quarter, quantize_sequence, report_quantization
+from seeding import add_seed_args, make_rng, variation_suffix
 
 # --- CLI SETUP ---
 parser = argparse.ArgumentParser(description="Joint multi-instrument Markov CSV generator")
@@ -12,7 +14,8 @@ parser.add_argument('--measures', type=int, default=None, help='Number of measur
 parser.add_argument('--beats_per_measure', type=int, default=4, help='Number of beats per measure (default=4)')
 parser.add_argument('--input', type=str, default='output', help='Base directory for input CSVs')
 parser.add_argument('--output', type=str, default='melodies', help='Base directory for generated CSVs')
-args = parser.parse_args()
+add_quantize_args(parser)
+add_seed_args(parser)
 
 
 # ------------------- MARKOV HELPERS -------------------
@@ -25,9 +28,9 @@ def read_instrument_csv(csv_path):
             event = (
                 row.get("Type", "Note"),
                 row.get("Pitch/Content", "REST"),
-                float(row.get("Duration_QuarterNotes", 1.0)),
+                parse_quarter(row.get("Duration_QuarterNotes", 1.0)),
                 float(row.get("Measure", 1)),
-                float(row.get("Beat", 1))
+                parse_quarter(row.get("Beat", 1))
             )
             events.append(event)
     return events
@@ -66,29 +69,29 @@ def build_joint_chain(joint_sequence, order):
 
 # ------------------- GENERATION -------------------
 
-def generate_joint_sequence(chain, order, length):
+def generate_joint_sequence(chain, order, length, rng=random):
     """Generate sequence by fixed number of events"""
     if not chain:
         return ["Insufficient Data"]
-    current_state = random.choice(list(chain.keys()))
+    current_state = rng.choice(list(chain.keys()))
     result_sequence = list(current_state)
     while len(result_sequence) < length:
         options = chain.get(current_state)
         if not options:
-            current_state = random.choice(list(chain.keys()))
+            current_state = rng.choice(list(chain.keys()))
             options = chain[current_state]
-        next_state = random.choice(options)
+        next_state = rng.choice(options)
         result_sequence.append(next_state)
         current_state = tuple(result_sequence[-order:])
     return result_sequence[:length]
 
 
-def generate_joint_sequence_by_measures(chain, order, num_measures, beats_per_measure):
+def generate_joint_sequence_by_measures(chain, order, num_measures, beats_per_measure, rng=random):
     """Generate sequence up to a certain number of measures"""
     if not chain:
         return ["Insufficient Data"]
 
-    current_state = random.choice(list(chain.keys()))
+    current_state = rng.choice(list(chain.keys()))
     result_sequence = list(current_state)
 
     # Track total absolute time in quarter notes
@@ -98,9 +101,9 @@ def generate_joint_sequence_by_measures(chain, order, num_measures, beats_per_me
     while total_time < max_time:
         options = chain.get(current_state)
         if not options:
-            current_state = random.choice(list(chain.keys()))
+            current_state = rng.choice(list(chain.keys()))
             options = chain[current_state]
-        next_state = random.choice(options)
+        next_state = rng.choice(options)
         result_sequence.append(next_state)
         state_duration = max(event[2] for event in next_state)
         total_time += state_duration
@@ -139,42 +142,59 @@ def save_joint_csvs(result_sequence, instrument_names, output_dir):
 
 # ------------------- MAIN EXECUTION -------------------
 
-input_base = args.input
-output_base = args.output
-
-if not os.path.exists(input_base):
-    print(f"Error: Input directory '{input_base}' not found.")
-    exit(1)
-
-for song_folder in os.listdir(input_base):
-    folder_path = os.path.join(input_base, song_folder)
-    if not os.path.isdir(folder_path):
-        continue
-
-    print(f"\nProcessing folder: {song_folder}")
-
-    # Map instrument name -> CSV path
-    instrument_csvs = {}
-    for csv_file in os.listdir(folder_path):
-        if csv_file.endswith(".csv"):
-            inst_name = os.path.splitext(csv_file)[0]
-            instrument_csvs[inst_name] = os.path.join(folder_path, csv_file)
-
-    joint_sequence, instrument_names = build_joint_sequence(instrument_csvs)
-    chain = build_joint_chain(joint_sequence, args.order)
-    print(f"Joint chain states learned: {len(chain)}")
-
-    # Generate either by measures or by length
-    if args.measures:
-        new_sequence = generate_joint_sequence_by_measures(chain, args.order,
-                                                           args.measures,
-                                                           args.beats_per_measure)
-    else:
-        new_sequence = generate_joint_sequence(chain, args.order, args.length)
-
-    # Output CSVs per instrument
-    target_dir = os.path.join(output_base, song_folder + "_generated_joint")
-    save_joint_csvs(new_sequence, instrument_names, target_dir)
-    print(f"CSV files saved in: {target_dir}")
-
-print("\nAll joint melodies processed and saved as CSVs.")
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    input_base = args.input
+    output_base = args.output
+
+    if not os.path.exists(input_base):
+        print(f"Error: Input directory '{input_base}' not found.")
+        exit(1)
+
+    # Sorted so instrument and song order never depends on the filesystem
+    for song_folder in sorted(os.listdir(input_base)):
+        folder_path = os.path.join(input_base, song_folder)
+        if not os.path.isdir(folder_path):
+            continue
+
+        print(f"\nProcessing folder: {song_folder}")
+
+        # Map instrument name -> CSV path
+        instrument_csvs = {}
+        for csv_file in sorted(os.listdir(folder_path)):
+            if csv_file.endswith(".csv"):
+                inst_name = os.path.splitext(csv_file)[0]
+                instrument_csvs[inst_name] = os.path.join(folder_path, csv_file)
+
+        joint_sequence, instrument_names = build_joint_sequence(instrument_csvs)
+
+        # Quantize every instrument's event inside each joint state
+        quantize_opts = quantize_options(args)
+        if quantize_opts:
+            raw_joint_sequence = joint_sequence
+            joint_sequence = [tuple(quantize_sequence(state, **quantize_opts)) for state in raw_joint_sequence]
+            report_quantization(song_folder, raw_joint_sequence, joint_sequence, args.order)
+
+        chain = build_joint_chain(joint_sequence, args.order)
+        print(f"Joint chain states learned: {len(chain)}")
+
+        for variation in range(args.variations):
+            rng = make_rng(args.seed, song_folder, variation)
+
+            # Generate either by measures or by length
+            if args.measures:
+                new_sequence = generate_joint_sequence_by_measures(chain, args.order,
+                                                                   args.measures,
+                                                                   args.beats_per_measure,
+                                                                   rng)
+            else:
+                new_sequence = generate_joint_sequence(chain, args.order, args.length, rng)
+
+            # Output CSVs per instrument
+            suffix = variation_suffix(variation, args.variations)
+            target_dir = os.path.join(output_base, song_folder + "_generated_joint" + suffix)
+            save_joint_csvs(new_sequence, instrument_names, target_dir)
+            print(f"CSV files saved in: {target_dir}")
+
+    print("\nAll joint melodies processed and saved as CSVs.")
@@ -1,50 +1,125 @@
 import csv
 import os
+import shutil
+import zipfile
+import tempfile
+import argparse
+import xml.etree.ElementTree as ET
 from pathlib import Path
-from music21 import converter, note, chord
+from mxlStreamReader import CSV_HEADER, iter_measures
 
-# 1. Setup Filepaths
-file_path = 'Songs\\the-avengers-theme-song-check-my-new-version.mxl'
-base_output = "output"
-sub_folder = Path(file_path).stem + "_data"
-output_dir = os.path.join(base_output, sub_folder)
-os.makedirs(output_dir, exist_ok=True)
+# --- CLI SETUP ---
+parser = argparse.ArgumentParser(description="Extract per-instrument note CSVs from a MusicXML score.")
+parser.add_argument('--file', type=str, default='Songs\\the-avengers-theme-song-check-my-new-version.mxl', help='Score to extract (.mxl or .musicxml).')
+parser.add_argument('--output', type=str, default='output', help='Base directory for extracted CSVs.')
+parser.add_argument('--backend', type=str, default='stream', choices=['stream', 'music21'],
+                    help='stream parses the XML directly (falls back to music21 if needed); music21 builds the full score.')
 
-# 2. Load the Score
-print(f"Loading {file_path}...")
-score = converter.parse(file_path)
+# Anything the streaming reader can trip over on odd or malformed files; music21 gets
+# a second try at all of them (UnsupportedScore is a ValueError)
+STREAM_ERRORS = (ET.ParseError, zipfile.BadZipFile, ValueError, KeyError, TypeError, AttributeError)
 
-# 3. Iterate through Parts
-for part in score.parts:
+
+def part_filename(output_dir, raw_name):
     # Get instrument name and sanitize it for a filename
-    raw_name = part.partName if part.partName else "Unknown_Instrument"
+    raw_name = raw_name if raw_name else "Unknown_Instrument"
     clean_name = "".join([c for c in raw_name if c.isalnum() or c in (' ', '_')]).rstrip()
-    filename = os.path.join(output_dir, f"{clean_name.replace(' ', '_')}.csv")
-    
-    print(f"Generating: {filename}")
-    
-    with open(filename, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['Measure', 'Beat', 'Type', 'Pitch/Content', 'Duration_QuarterNotes'])
-        
-        # .notesAndRests captures Notes, Chords, and Rests
-        for element in part.recurse().notesAndRests:
-            m_num = element.measureNumber
-            beat = element.beat
-            duration = element.duration.quarterLength
-            
-            if isinstance(element, note.Note):
-                content = element.pitch.nameWithOctave
-                item_type = 'Note'
-            elif isinstance(element, chord.Chord):
-                content = ";".join([str(p.nameWithOctave) for p in element.pitches])
-                item_type = 'Chord'
-            elif isinstance(element, note.Rest):
-                content = 'REST'
-                item_type = 'Rest'
-            else:
-                continue
-                
-            writer.writerow([m_num, beat, item_type, content, duration])
-
-print(f"\nSuccess! All files are saved in the directory: '{output_dir}'")
\ No newline at end of file
+    return os.path.join(output_dir, f"{clean_name.replace(' ', '_')}.csv")
+
+
+# --- STREAMING BACKEND ---
+
+def extract_stream(file_path, output_dir):
+    # Write into a scratch folder next to output_dir and only move the CSVs over once
+    # the whole score has been read, so a failure halfway leaves no partial files
+    scratch_dir = tempfile.mkdtemp(prefix='.stream_', dir=os.path.dirname(os.path.abspath(output_dir)))
+    try:
+        write_stream_csvs(file_path, output_dir, scratch_dir)
+        for name in os.listdir(scratch_dir):
+            os.replace(os.path.join(scratch_dir, name), os.path.join(output_dir, name))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def write_stream_csvs(file_path, output_dir, scratch_dir):
+    current_part = None
+    f = None
+    writer = None
+
+    try:
+        for part_index, part_name, rows in iter_measures(file_path):
+            if part_index != current_part:
+                if f is not None:
+                    f.close()
+                filename = part_filename(output_dir, part_name)
+                print(f"Generating: {filename}")
+
+                f = open(os.path.join(scratch_dir, os.path.basename(filename)), mode='w', newline='', encoding='utf-8')
+                writer = csv.writer(f)
+                writer.writerow(CSV_HEADER)
+                current_part = part_index
+
+            writer.writerows(rows)
+    finally:
+        if f is not None:
+            f.close()
+
+
+# --- MUSIC21 BACKEND ---
+
+def extract_music21(file_path, output_dir):
+    from music21 import converter, note, chord
+
+    score = converter.parse(file_path)
+
+    for part in score.parts:
+        filename = part_filename(output_dir, part.partName)
+        print(f"Generating: {filename}")
+
+        with open(filename, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+
+            # .notesAndRests captures Notes, Chords, and Rests
+            for element in part.recurse().notesAndRests:
+                m_num = element.measureNumber
+                beat = element.beat
+                duration = element.duration.quarterLength
+
+                if isinstance(element, note.Note):
+                    content = element.pitch.nameWithOctave
+                    item_type = 'Note'
+                elif isinstance(element, chord.Chord):
+                    content = ";".join([str(p.nameWithOctave) for p in element.pitches])
+                    item_type = 'Chord'
+                elif isinstance(element, note.Rest):
+                    content = 'REST'
+                    item_type = 'Rest'
+                else:
+                    continue
+
+                writer.writerow([m_num, beat, item_type, content, duration])
+
+
+# --- MAIN EXECUTION ---
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    file_path = args.file
+    sub_folder = Path(file_path).stem + "_data"
+    output_dir = os.path.join(args.output, sub_folder)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Loading {file_path}...")
+
+    if args.backend == 'stream':
+        try:
+            extract_stream(file_path, output_dir)
+        except STREAM_ERRORS as e:
+            print(f"Streaming reader can't handle this score ({type(e).__name__}: {e}); falling back to music21")
+            extract_music21(file_path, output_dir)
+    else:
+        extract_music21(file_path, output_dir)
+
+    print(f"\nSuccess! All files are saved in the directory: '{output_dir}'")
@@ -0,0 +1,376 @@
+import zipfile
+import xml.etree.ElementTree as ET
+from fractions import Fraction
+
+# Streaming MusicXML reader: walks the score with iterparse and turns each
+# <measure> into Measure/Beat/Type/Pitch/Duration rows as soon as it closes,
+# then drops it, so memory stays bounded by one measure.
+#
+# The rows follow what music21's importer + `part.recurse().notesAndRests`
+# produce (offsets, beats, pickups, voices, staff splitting), so the CSVs
+# match the ones written by the music21 backend in mxlExtractor.py.
+
+CSV_HEADER = ['Measure', 'Beat', 'Type', 'Pitch/Content', 'Duration_QuarterNotes']
+
+# Accidental names as music21 spells them; unknown names print no modifier
+ACCIDENTAL_MODIFIERS = {
+    'sharp': '#', 'flat': '-', 'natural': '',
+    'double-sharp': '##', 'sharp-sharp': '##',
+    'flat-flat': '--', 'double-flat': '--',
+    'triple-sharp': '###', 'triple-flat': '---',
+    'quarter-sharp': '~', 'quarter-flat': '`',
+    'three-quarters-sharp': '#~', 'three-quarters-flat': '-`',
+}
+ALTER_MODIFIERS = {
+    0: '', 1: '#', -1: '-', 2: '##', -2: '--', 3: '###', -3: '---',
+    0.5: '~', -0.5: '`', 1.5: '#~', -1.5: '-`',
+}
+NO_STAFF = 0
+
+
+class UnsupportedScore(ValueError):
+    """Raised for MusicXML the streaming reader cannot mirror; fall back to music21"""
+
+
+# ------------------- HELPERS -------------------
+
+def text_of(element, path, default=None):
+    found = element.find(path)
+    if found is None or found.text is None or not found.text.strip():
+        return default
+    return found.text.strip()
+
+
+def format_quarter(value):
+    """Print a quarter-length the way music21 does: binary fractions as floats, others as 'n/d'"""
+    denominator = value.denominator
+    if denominator & (denominator - 1) == 0:
+        return str(float(value))
+    return str(value)
+
+
+def open_score(archive):
+    """Find the main score file inside an .mxl archive"""
+    try:
+        container = ET.fromstring(archive.read('META-INF/container.xml'))
+        for element in container.iter():
+            if element.tag.endswith('rootfile') and element.get('full-path'):
+                return archive.open(element.get('full-path'))
+    except KeyError:
+        pass
+    for name in archive.namelist():
+        if not name.startswith('META-INF') and name.endswith(('.xml', '.musicxml')):
+            return archive.open(name)
+    raise UnsupportedScore("No MusicXML score found in archive")
+
+
+def beat_lengths(time_element):
+    """Beat lengths (in quarter notes) of a <time> element, using music21's default partitions"""
+    if time_element.find('senza-misura') is not None or len(time_element.findall('beats')) != 1:
+        raise UnsupportedScore("Only single-fraction time signatures are supported")
+
+    groups = [int(g) for g in text_of(time_element, 'beats').split('+')]
+    beat_type = int(text_of(time_element, 'beat-type'))
+    unit = Fraction(4, beat_type)
+
+    if len(groups) > 1:  # additive meters like 3+2/8 get one beat per group
+        return [group * unit for group in groups]
+
+    numerator = groups[0]
+    if numerator == 3 and beat_type < 8:
+        return [unit] * 3
+    if numerator == 3 or numerator in (6, 9, 12) or (numerator >= 15 and numerator % 3 == 0):
+        return [3 * unit] * (numerator // 3)
+    return [unit] * numerator
+
+
+def beat_of(offset, beats):
+    if beats is None:
+        return 'nan'
+    bar_length = sum(beats)
+    if offset >= bar_length:
+        offset %= bar_length
+
+    start = Fraction(0)
+    for index, length in enumerate(beats):
+        if offset < start + length:
+            return format_quarter(index + 1 + (offset - start) / length)
+        start += length
+
+
+def pitch_name(note_element):
+    step = text_of(note_element, 'pitch/step')
+    octave = text_of(note_element, 'pitch/octave', '')
+
+    accidental = text_of(note_element, 'accidental')
+    alter = text_of(note_element, 'pitch/alter')
+    if accidental is not None:
+        modifier = ACCIDENTAL_MODIFIERS.get(accidental.lower(), '')
+    elif alter is not None:
+        modifier = ALTER_MODIFIERS.get(float(alter))
+        if modifier is None:
+            raise UnsupportedScore(f"Unsupported alter {alter}")
+    else:
+        modifier = ''
+    return step + modifier + octave
+
+
+def measure_number(raw, last_number, last_suffix):
+    digits = "".join(c for c in raw if c.isdigit())
+    suffix = "".join(c for c in raw if not c.isdigit())
+    number = int(digits) if digits else 0
+
+    # Finale/MuseScore style unnumbered measures (X1, X2, ...) keep the previous number
+    if last_number is not None and suffix == 'X' and number != last_number + 1:
+        suffix = (last_suffix or '') + suffix + str(number)
+        number = last_number
+    return number, suffix
+
+
+# ------------------- MEASURE PARSING -------------------
+
+class PartState:
+    """Everything that carries over from one measure of a part to the next"""
+
+    def __init__(self):
+        self.divisions = None
+        self.beats = None
+        self.staves = 1
+        self.last_number = None
+        self.last_suffix = ''
+        self.part_offset = Fraction(0)
+        self.last_was_short = False
+        self.started = False
+
+
+def note_length(note_element, divisions):
+    if note_element.find('grace') is not None:
+        return Fraction(0)
+    duration = text_of(note_element, 'duration')
+    if duration is None:
+        return Fraction(0)
+    if divisions is None:
+        raise UnsupportedScore("Note duration given before <divisions>")
+    return Fraction(duration) / divisions
+
+
+def note_staff(note_element):
+    staff = text_of(note_element, 'staff')
+    return int(staff) if staff is not None else NO_STAFF
+
+
+def describe(note_elements):
+    """(Type, Pitch/Content) for a note or chord, or None for events the CSV skips"""
+    if any(n.find('unpitched') is not None for n in note_elements):
+        return None  # unpitched percussion is not a note.Note/chord.Chord
+    if len(note_elements) == 1:
+        if note_elements[0].find('rest') is not None:
+            return 'Rest', 'REST'
+        if note_elements[0].find('pitch') is None:
+            return None
+        return 'Note', pitch_name(note_elements[0])
+    if any(n.find('pitch') is None for n in note_elements):
+        raise UnsupportedScore("Chords with rests or unpitched members are not supported")
+    return 'Chord', ";".join(pitch_name(n) for n in note_elements)
+
+
+def is_plain_whole(note_element, length):
+    """Whole/breve without dots or tuplets, as music21 would type it"""
+    note_type = text_of(note_element, 'type') or {4: 'whole', 8: 'breve'}.get(length)
+    return (note_type in ('whole', 'breve') and note_element.find('dot') is None
+            and note_element.find('time-modification') is None)
+
+
+def read_measure(measure, state):
+    """Turn one <measure> element into CSV rows, updating the part state"""
+    number, state.last_suffix = measure_number(measure.get('number', ''), state.last_number, state.last_suffix)
+    state.last_number = number
+
+    children = list(measure)
+    voice_ids = {text_of(child, 'voice') for child in children if child.tag in ('note', 'forward')}
+    voice_ids.discard(None)
+    use_voices = len(voice_ids) > 1
+
+    events = []
+    offset = Fraction(0)
+    last_voice = None
+    chord_notes = []
+    rest_count = 0
+    note_count = 0
+    full_measure_rest = False
+
+    def add_event(voice_source, note_elements):
+        nonlocal last_voice
+        voice = text_of(voice_source, 'voice')
+        if voice is not None:
+            last_voice = voice
+        else:
+            voice = last_voice if last_voice is not None else '1'
+        first = note_elements[0]
+        events.append({
+            "staff": note_staff(first),
+            "voice": voice if use_voices else None,
+            "offset": offset,
+            "grace": first.find('grace') is not None,
+            "order": len(events),
+            "description": describe(note_elements),
+            "length": note_length(first, state.divisions),
+            "element": first,
+        })
+        return events[-1]
+
+    for index, child in enumerate(children):
+        if child.tag == 'attributes':
+            divisions = text_of(child, 'divisions')
+            if divisions is not None:
+                state.divisions = Fraction(divisions)
+            time_element = child.find('time')
+            if time_element is not None:
+                state.beats = beat_lengths(time_element)
+            staves = text_of(child, 'staves')
+            if staves is not None:
+                if state.started and int(staves) != state.staves:
+                    raise UnsupportedScore("Staff count changes mid-part")
+                state.staves = int(staves)
+
+        elif child.tag == 'note':
+            following = children[index + 1] if index + 1 < len(children) else None
+            next_is_chord = (following is not None and following.tag == 'note'
+                             and following.find('chord') is not None)
+            if next_is_chord and text_of(child, 'voice') is not None:
+                last_voice = text_of(child, 'voice')
+
+            if child.find('chord') is not None or next_is_chord:
+                chord_notes.append(child)
+                if not next_is_chord:
+                    voiced = [n for n in chord_notes if n.find('voice') is not None]
+                    offset += add_event(voiced[0] if voiced else child, chord_notes)["length"]
+                    chord_notes = []
+                continue
+
+            event = add_event(child, [child])
+            offset += event["length"]
+            rest = child.find('rest')
+            if rest is None:
+                note_count += 1
+            else:
+                rest_count += 1
+                if rest.get('measure') == 'yes' and text_of(child, 'type') in (None, 'whole', 'breve'):
+                    event["full_measure"] = True
+                    full_measure_rest = True
+
+        elif child.tag in ('backup', 'forward'):
+            duration = text_of(child, 'duration')
+            if duration is not None:
+                change = Fraction(duration) / state.divisions
+                offset = max(offset - change, Fraction(0)) if child.tag == 'backup' else offset + change
+
+    state.started = True
+    bar_length = sum(state.beats) if state.beats is not None else Fraction(4)
+
+    def sort_key(event):
+        return (event["voice"] is None, event["voice"] or '', event["offset"], not event["grace"], event["order"])
+
+    # A lone or measure="yes" rest is stretched to fill the bar
+    if full_measure_rest or (rest_count == 1 and note_count == 0):
+        rests = [e for e in events if e["description"] == ('Rest', 'REST')]
+        if rests:
+            first_rest = min(rests, key=sort_key)
+            if first_rest.get("full_measure") or (first_rest["length"] != bar_length
+                                                  and is_plain_whole(first_rest["element"], first_rest["length"])):
+                first_rest["length"] = bar_length
+
+    # Pickup and empty-measure handling mirrors music21's measure offset bookkeeping
+    highest = max((e["offset"] + e["length"] for e in events), default=Fraction(0))
+    padding = Fraction(0)
+    if highest >= bar_length:
+        state.part_offset += highest
+    elif highest == 0 and not events:
+        events.append({"staff": NO_STAFF, "voice": None, "offset": Fraction(0), "grace": False, "order": 0,
+                       "description": ('Rest', 'REST'), "length": bar_length})
+        state.part_offset += bar_length
+        state.last_was_short = False
+    else:
+        if state.part_offset == 0:
+            padding = bar_length - highest
+        elif state.last_was_short:
+            padding = bar_length - highest
+            state.last_was_short = False
+        else:
+            state.last_was_short = True
+        state.part_offset += highest
+
+    # Multi-staff parts become one music21 part per staff, all with the same name,
+    # so the last staff's CSV is the one that survives; keep only that staff.
+    if state.staves > 1:
+        events = [e for e in events if e["staff"] in (NO_STAFF, state.staves)]
+
+    # A split-off staff left with a single voice gets flattened back into the measure
+    if state.staves > 1 and len({e["voice"] for e in events}) == 1:
+        for e in events:
+            e["voice"] = None
+
+    rows = []
+    for event in sorted(events, key=sort_key):
+        if event["description"] is None:
+            continue
+        # music21 only adds pickup padding for elements sitting directly in the measure
+        event_offset = event["offset"] + padding if event["voice"] is None else event["offset"]
+        event_type, content = event["description"]
+        rows.append([number, beat_of(event_offset, state.beats), event_type, content,
+                     format_quarter(event["length"])])
+    return rows
+
+
+# ------------------- SCORE STREAMING -------------------
+
+def iter_measures(file_path):
+    """Yield (part_index, part_name, rows) for every measure, one part after another.
+
+    Each part also yields once with no rows when it starts, so empty parts still show up.
+    """
+    if zipfile.is_zipfile(file_path):
+        archive = zipfile.ZipFile(file_path)
+        source = open_score(archive)
+    else:
+        archive = None
+        source = open(file_path, 'rb')
+
+    try:
+        part_names = {}
+        part_index = -1
+        state = None
+        current_part = None
+        root = None
+        depth = 0
+
+        for event, element in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                    if element.tag != 'score-partwise':
+                        raise UnsupportedScore(f"Unsupported root element <{element.tag}>")
+                elif depth == 1 and element.tag == 'part':
+                    part_index += 1
+                    current_part = element
+                    state = PartState()
+                    yield part_index, part_names.get(element.get('id')), []
+                depth += 1
+                continue
+
+            depth -= 1
+            if element.tag == 'score-part':
+                # music21 folds multi-line part names onto one line
+                name = text_of(element, 'part-name')
+                part_names[element.get('id')] = name.replace('\n', ' ') if name is not None else None
+            elif element.tag == 'measure' and depth == 2:
+                rows = read_measure(element, state)
+                current_part.remove(element)
+                yield part_index, part_names.get(current_part.get('id')), rows
+
+            if depth == 1:
+                root.remove(element)
+    finally:
+        source.close()
+        if archive is not None:
+            archive.close()
@@ -0,0 +1,177 @@
+import re
+import math
+import argparse
+from fractions import Fraction
+
+# Shared event normalization used by the generators at load time.
+# Events are tuples laid out as (Type, Pitch/Content, Duration, ..., Beat);
+# anything between the duration and the beat (e.g. Measure) is left untouched.
+
+SHARP_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+STEP_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+PITCH_PATTERN = re.compile(r'^([A-G])([#\-]*)(\d+)?$')
+# Pitch names can't spell negative octaves ('C-1' reads back as C-flat 1)
+MIN_OCTAVE, MAX_OCTAVE = 0, 9
+
+
+# ------------------- CLI -------------------
+
+def int_in_range(low, high=None):
+    """argparse type for an integer between low and high (inclusive; high=None is open)"""
+    def parse(text):
+        try:
+            value = int(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid integer: '{text}'")
+        if value < low or (high is not None and value > high):
+            bounds = f"at least {low}" if high is None else f"between {low} and {high}"
+            raise argparse.ArgumentTypeError(f"must be {bounds}, got {value}")
+        return value
+    return parse
+
+
+def add_quantize_args(parser):
+    parser.add_argument('--grid', type=int_in_range(1), default=None,
+                        help='Snap durations and beats to 1/GRID of a quarter note (e.g. 4 = sixteenths, 12 = with triplets)')
+    parser.add_argument('--canonical_chords', action='store_true',
+                        help='Respell pitches with sharps and sort/deduplicate chord tones')
+    parser.add_argument('--fold_octave', type=int_in_range(MIN_OCTAVE, MAX_OCTAVE), default=None,
+                        help='Move every pitch into this octave')
+
+
+def quantize_options(args):
+    """Collect the quantization flags into keyword arguments, or None when all are off"""
+    options = {
+        "grid": args.grid,
+        "canonical_chords": args.canonical_chords,
+        "fold_octave": args.fold_octave,
+    }
+    if options["grid"] is None and not options["canonical_chords"] and options["fold_octave"] is None:
+        return None
+    return options
+
+
+# ------------------- RHYTHM -------------------
+
+def parse_quarter(value):
+    """Parse a CSV duration/beat such as '0.5', '2' or '4/3' into a float"""
+    try:
+        return float(Fraction(str(value).strip()))
+    except ValueError:
+        # 'nan' (beats in measures without a time signature) isn't a rational literal
+        return float(value)
+
+
+def snap(value, grid):
+    """Round a quarter-note value to the nearest multiple of 1/grid"""
+    if not math.isfinite(value):
+        return value
+    return float(Fraction(round(Fraction(value) * grid), grid))
+
+
+def snap_duration(value, grid):
+    if not math.isfinite(value):
+        return value
+    # Never let a sounding event collapse to zero length
+    if value <= 0:
+        return 0.0
+    return max(snap(value, grid), 1.0 / grid)
+
+
+# ------------------- PITCH -------------------
+
+def parse_pitch(name):
+    """Split a music21 pitch name ('C#4', 'B-3') into (semitone, octave) or None if unrecognised"""
+    match = PITCH_PATTERN.match(name)
+    if not match:
+        return None
+    step, accidentals, octave = match.groups()
+    semitone = STEP_SEMITONES[step] + accidentals.count('#') - accidentals.count('-')
+    return semitone, int(octave) if octave is not None else None
+
+
+def normalize_pitch(name, canonical=False, fold_octave=None):
+    parsed = parse_pitch(name)
+    if parsed is None:
+        return name
+    semitone, octave = parsed
+
+    if not canonical:
+        # Keep the original spelling, only swap the octave
+        if fold_octave is None or octave is None:
+            return name
+        return name.rstrip('0123456789') + str(fold_octave)
+
+    if octave is not None:
+        # Let B#3 become C4 and C-4 become B3
+        octave += semitone // 12
+    if fold_octave is not None and octave is not None:
+        octave = fold_octave
+    spelled = SHARP_NAMES[semitone % 12]
+    return spelled + str(octave) if octave is not None else spelled
+
+
+def pitch_height(name):
+    parsed = parse_pitch(name)
+    if parsed is None:
+        return float('inf')
+    semitone, octave = parsed
+    return semitone + 12 * (octave if octave is not None else 4)
+
+
+def normalize_content(event_type, content, canonical_chords=False, fold_octave=None):
+    """Normalize the Pitch/Content field; returns the (possibly changed) type and content"""
+    if content == "REST" or (not canonical_chords and fold_octave is None):
+        return event_type, content
+
+    pitches = [normalize_pitch(p, canonical_chords, fold_octave) for p in content.split(";")]
+
+    # Folding and respelling can turn distinct chord tones into duplicates
+    pitches = list(dict.fromkeys(pitches))
+    if canonical_chords:
+        pitches.sort(key=pitch_height)
+
+    if event_type == "Chord" and len(pitches) == 1:
+        event_type = "Note"
+    return event_type, ";".join(pitches)
+
+
+# ------------------- EVENTS -------------------
+
+def check_options(grid=None, canonical_chords=False, fold_octave=None):
+    """Raise ValueError for options the CLI flags would have rejected"""
+    if grid is not None and grid < 1:
+        raise ValueError(f"grid must be at least 1, got {grid}")
+    if fold_octave is not None and not MIN_OCTAVE <= fold_octave <= MAX_OCTAVE:
+        raise ValueError(f"fold_octave must be between {MIN_OCTAVE} and {MAX_OCTAVE}, got {fold_octave}")
+
+
+def quantize_event(event, grid=None, canonical_chords=False, fold_octave=None):
+    event_type, content, duration = event[0], event[1], event[2]
+    middle, beat = event[3:-1], event[-1]
+
+    event_type, content = normalize_content(event_type, content, canonical_chords, fold_octave)
+    if grid is not None:
+        duration = snap_duration(duration, grid)
+        beat = snap(beat, grid)
+
+    return (event_type, content, duration) + tuple(middle) + (beat,)
+
+
+def quantize_sequence(events, **options):
+    check_options(**options)
+    return [quantize_event(event, **options) for event in events]
+
+
+# ------------------- REPORTING -------------------
+
+def count_states(sequence, order):
+    """Number of distinct order-length windows, i.e. the states a Markov chain would learn"""
+    return len({tuple(sequence[i:i + order]) for i in range(len(sequence) - order)})
+
+
+def report_quantization(label, raw_sequence, sequence, order=None):
+    message = f"{label} → vocabulary: {len(set(raw_sequence))} -> {len(set(sequence))}"
+    if order is not None:
+        message += f", states: {count_states(raw_sequence, order)} -> {count_states(sequence, order)}"
+    print(message)
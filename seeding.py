@@ -0,0 +1,45 @@
+import hashlib
+import random
+
+
+# --- CLI HELPERS ---
+
+def add_seed_args(parser):
+    group = parser.add_argument_group('reproducibility')
+    group.add_argument('--seed', type=int, default=None,
+                       help='Root seed; the same seed and options always produce the same output.')
+    group.add_argument('--variations', type=int, default=1,
+                       help='Number of takes to generate per song (default=1).')
+
+
+def variation_suffix(variation, variations):
+    """Output name suffix for a take; single-take runs keep the old file names"""
+    return "" if variations <= 1 else f"_v{variation + 1}"
+
+
+# --- RNG STREAMS ---
+# Every stream is keyed by name (song, instrument, variation) rather than by the
+# order it was requested in, so a take is identical no matter how many other
+# songs were generated before it, or by which worker.
+
+def derive_seed(root_seed, *keys):
+    """Stable 64-bit seed for the stream named by keys under root_seed"""
+    material = "\x1f".join([str(root_seed)] + [str(key) for key in keys])
+    digest = hashlib.sha256(material.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def make_rng(root_seed, *keys):
+    """random.Random for one stream, or the global random module when unseeded"""
+    if root_seed is None:
+        return random
+    return random.Random(derive_seed(root_seed, *keys))
+
+
+def make_numpy_rng(root_seed, *keys):
+    """numpy RandomState (what hmmlearn expects) for one stream, or None when unseeded"""
+    if root_seed is None:
+        return None
+    import numpy as np
+    seed_seq = np.random.SeedSequence(derive_seed(root_seed, *keys))
+    return np.random.RandomState(np.random.MT19937(seed_seq))